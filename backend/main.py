@@ -8,45 +8,80 @@ Provides endpoints for:
 """
 
 import os
-import io
+import re
+import json
 import time
-import base64
 import asyncio
-from PIL import Image
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Set, Union
 
 import cv2
 import numpy as np
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # Local imports
-from services.detection import ObjectDetector, DetectedObject, get_detector
-from services.depth import DepthEstimator, get_depth_estimator
-from services.tts import generate_voice_and_track_cost
+from services.detection import DetectionBatcher, ObjectDetector, DetectedObject, get_detector
+from services.depth import (
+    DepthBatcher,
+    DepthEstimator,
+    DepthWorker,
+    get_depth_estimator,
+    warmup_bbox_medians,
+)
+from services.tts import stream_voice_and_track_cost
 from services.reasoning import ObstacleClassifier, get_classifier
-from services.pathfinding import get_pathfinder
+from services.pathfinding import PathFinder, get_pathfinder
 from services.map_analyzer import get_map_analyzer
-from services.braille import get_braille_reader
+from services.braille import BrailleReader, get_braille_reader
+from services.frame_processor import (
+    JpegEncoder,
+    WebpEncoder,
+    b64decode,
+    b64encode,
+    decode_jpeg,
+    decode_jpeg_sized,
+    encode_jpeg,
+    frame_dhash,
+)
 
 load_dotenv()
 
+# Decode, annotate and encode run on asyncio.to_thread workers, one frame per
+# connection at a time, alongside the YOLO/MiDaS batchers. That concurrency
+# already fills the cores, so stop each OpenCV call from also fanning out to
+# its own thread pool (oversubscription costs more than it parallelises).
+cv2.setNumThreads(1)
+
+# Prefer orjson (Rust) for JSON encoding; fall back to the stdlib encoder
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as JSONResponse
+except ImportError:
+    orjson = None
+    from fastapi.responses import JSONResponse
+
+
+_JSON_NATIVE = frozenset((str, int, float, bool, type(None)))
+
 
 def _make_json_serializable(obj):
-    """Convert numpy/scalar types to native Python for JSON."""
-    if hasattr(obj, "item"):
-        return obj.item()
-    if isinstance(obj, (list, tuple)):
-        return [_make_json_serializable(x) for x in obj]
+    """Convert numpy arrays/scalars to native Python for JSON."""
+    # Fast path: most leaves are already native (exact type check, no MRO walk)
+    if type(obj) in _JSON_NATIVE:
+        return obj
     if isinstance(obj, dict):
         return {k: _make_json_serializable(v) for k, v in obj.items()}
-    if isinstance(obj, (np.floating, np.integer)):
-        return float(obj) if isinstance(obj, np.floating) else int(obj)
+    if isinstance(obj, (list, tuple)):
+        return [_make_json_serializable(x) for x in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        # One C-level conversion for a whole array (scalars work too)
+        return obj.tolist()
     return obj
 
 
@@ -67,44 +102,110 @@ class NavigateRequest(BaseModel):
 
 # Global model instances
 detector: Optional[ObjectDetector] = None
+# Batches /ws/video frames from concurrent connections into one YOLO call
+detection_batcher: Optional[DetectionBatcher] = None
 depth_estimator: Optional[DepthEstimator] = None
+# Per-request helpers — resolved once in lifespan, not on every frame
+classifier: Optional[ObstacleClassifier] = None
+pathfinder: Optional[PathFinder] = None
+braille_reader: Optional[BrailleReader] = None
+# MiDaS in a separate process — only used when depth runs on the CPU
+depth_worker: Optional[DepthWorker] = None
+depth_batcher: Optional[DepthBatcher] = None
+
+# Gemini announcements keyed by (frame dHash, detected labels, navigation context)
+ANNOUNCEMENT_CACHE_SIZE = 128
+# dHashes this many bits apart (of 64) still count as the same scene
+ANNOUNCEMENT_MAX_HASH_DISTANCE = 4
+_announcement_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+# Upper bound for one image payload (upload body or WebSocket frame) —
+# well above any phone camera JPEG, so only broken/abusive input hits it.
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+# /ws/video and /analyze-and-announce frames larger than this are halved (or
+# more) while decoding — YOLO letterboxes to 640 and MiDaS_small to 256, so
+# extra pixels are wasted. (/detect keeps full resolution: its bboxes are the
+# response, in the caller's pixel coordinates. /analyze-and-announce maps its
+# returned bboxes/centers back to the upload's coordinates; only its annotated
+# frame stays at the reduced size.)
+STREAM_MAX_SIDE = 720
+
+# Destination room in a navigation context string, e.g. "heading to room 0010"
+_ROOM_RE = re.compile(r'room\s*(\w+)', re.IGNORECASE)
+
+
+async def _load_depth_estimator() -> Optional[DepthEstimator]:
+    """Load MiDaS off the event loop; None (depth disabled) if it fails."""
+    print("\n📦 Loading depth estimation model (MiDaS)...")
+    try:
+        return await asyncio.to_thread(get_depth_estimator)
+    except Exception as e:
+        print(f"⚠️  Depth model failed to load: {e}")
+        print("   Distance estimation will be disabled.")
+        return None
+
+
+async def _load_floor_plan(pathfinder: PathFinder):
+    """Analyse the floor plan (cached after the first run) and build the navigation graph."""
+    svg_path = os.path.join("static", "floor_plans", "basement.svg")
+    if not os.path.exists(svg_path):
+        print(f"⚠️  Floor plan not found at {svg_path}")
+        return
+    try:
+        analyzer = get_map_analyzer()
+        analysis = await analyzer.get_or_create_analysis(svg_path)
+        pathfinder.load_from_analysis(analysis)
+        rooms = pathfinder.get_available_rooms()
+        print(f"🗺️  Known rooms: {', '.join(rooms)}")
+    except Exception as e:
+        print(f"⚠️  Map analysis failed: {e}")
+        print("   Navigation will be limited.")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load ML models and analyse floor plan on startup."""
-    global detector, depth_estimator
+    global detector, detection_batcher, depth_estimator, depth_worker, depth_batcher
+    global classifier, pathfinder, braille_reader
     
     print("="*50)
     print("🚀 Starting Indoor Navigation CV Service")
     print("="*50)
     
+    classifier = get_classifier()
+    pathfinder = get_pathfinder()
+    
+    # ── YOLO, MiDaS and the floor plan load concurrently — none depends on another ──
     print("\n📦 Loading object detection model (YOLOv8)...")
-    detector = get_detector()
+    detector, depth_estimator, _ = await asyncio.gather(
+        asyncio.to_thread(get_detector),
+        _load_depth_estimator(),
+        _load_floor_plan(pathfinder),
+    )
+    detection_batcher = DetectionBatcher(detector)
+    detection_batcher.start()
     
-    print("\n📦 Loading depth estimation model (MiDaS)...")
-    try:
-        depth_estimator = get_depth_estimator()
-    except Exception as e:
-        print(f"⚠️  Depth model failed to load: {e}")
-        print("   Distance estimation will be disabled.")
-        depth_estimator = None
+    if depth_estimator is not None:
+        # The per-bbox lookup runs on the event loop — JIT it now, not on
+        # the first frame (which would stall every connection)
+        await asyncio.to_thread(warmup_bbox_medians)
     
-    # ── Analyse floor plan and build navigation graph ──
-    svg_path = os.path.join("static", "floor_plans", "basement.svg")
-    if os.path.exists(svg_path):
+    if depth_estimator is not None and depth_estimator.device.type == "cpu":
+        print("\n📦 Starting out-of-process depth worker (CPU)...")
         try:
-            analyzer = get_map_analyzer()
-            analysis = await analyzer.get_or_create_analysis(svg_path)
-            pathfinder = get_pathfinder()
-            pathfinder.load_from_analysis(analysis)
-            rooms = pathfinder.get_available_rooms()
-            print(f"🗺️  Known rooms: {', '.join(rooms)}")
+            depth_worker = DepthWorker(model_type=depth_estimator.model_type)
+            await asyncio.to_thread(depth_worker.start)
         except Exception as e:
-            print(f"⚠️  Map analysis failed: {e}")
-            print("   Navigation will be limited.")
-    else:
-        print(f"⚠️  Floor plan not found at {svg_path}")
+            print(f"⚠️  Depth worker failed to start: {e}")
+            print("   Falling back to in-process depth.")
+            if depth_worker is not None:
+                depth_worker.close()
+            depth_worker = None
+    elif depth_estimator is not None:
+        # GPU: frames from concurrent clients share one MiDaS forward pass
+        depth_batcher = DepthBatcher(depth_estimator)
+        depth_batcher.start()
     
     print("\n📦 Loading braille detection service...")
     braille_reader = get_braille_reader()
@@ -115,6 +216,11 @@ async def lifespan(app: FastAPI):
     yield
     
     print("\n👋 Shutting down...")
+    await detection_batcher.stop()
+    if depth_batcher is not None:
+        await depth_batcher.stop()
+    if depth_worker is not None:
+        depth_worker.close()
 
 
 app = FastAPI(
@@ -122,6 +228,7 @@ app = FastAPI(
     description="Real-time object detection and distance estimation for visually impaired navigation",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=JSONResponse,
 )
 
 # CORS - allow phone browser to access
@@ -129,14 +236,156 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for phone testing
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],  # Static lists: preflight headers built once
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,  # Let browsers cache preflight responses for 24h
 )
 
 # Serve static files (camera test page)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+async def _read_upload(file: UploadFile) -> bytes:
+    """Read an uploaded image, rejecting oversized bodies before any decoding."""
+    if file.size is not None and file.size > MAX_FRAME_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    return await file.read()
+
+
+async def _estimate_depth_async(frame: np.ndarray) -> np.ndarray:
+    """MiDaS depth map — batched across clients on GPU, else in a worker thread."""
+    if depth_batcher is not None:
+        return (await depth_batcher.estimate(frame))[0]
+    return await asyncio.to_thread(_estimate_depth, frame)
+
+
+async def _detect_and_measure(frame: np.ndarray, estimate_depth: bool = True) -> List[DetectedObject]:
+    """
+    Run YOLO detection and, when depth is available, MiDaS — concurrently,
+    since neither needs the other's output — then attach distances.
+    """
+    if not estimate_depth or depth_estimator is None:
+        return await detection_batcher.detect(frame)
+    detections, depth_map = await asyncio.gather(
+        detection_batcher.detect(frame), _estimate_depth_async(frame)
+    )
+    _apply_distances(depth_map, detections)
+    return detections
+
+
+# ── Blocking CV helpers (run via asyncio.to_thread, never on the event loop) ──
+
+def _estimate_depth(frame: np.ndarray) -> np.ndarray:
+    """MiDaS depth map, computed in the worker process when one is running."""
+    if depth_worker is not None:
+        return depth_worker.estimate(frame)[0]
+    return depth_estimator.estimate(frame)[0]
+
+
+def _apply_distances(depth_map: np.ndarray, detections: List[DetectedObject]):
+    """Set det.distance for all detections with one array-wide depth lookup."""
+    bboxes = np.array([det.bbox for det in detections], dtype=np.int32).reshape(-1, 4)
+    distances = depth_estimator.get_distances_for_bboxes(depth_map, bboxes)
+    for det, distance in zip(detections, distances.tolist()):
+        det.distance = distance
+
+
+# One bit per label seen so far — a label set becomes a plain int bitmask
+_LABEL_BITS: Dict[str, int] = {}
+
+
+def _label_mask(detection_dicts: List[dict]) -> int:
+    """Bitmask of the distinct labels in a frame (equal masks ⇔ equal label sets)."""
+    mask = 0
+    for d in detection_dicts:
+        bit = _LABEL_BITS.get(d["label"])
+        if bit is None:
+            bit = _LABEL_BITS[d["label"]] = 1 << len(_LABEL_BITS)
+        mask |= bit
+    return mask
+
+
+def _find_cached_announcement(scene_key: tuple) -> Optional[tuple]:
+    """
+    Key of a cached announcement for this scene: an exact match, else the
+    most recent entry with the same labels and context whose dHash is within
+    ANNOUNCEMENT_MAX_HASH_DISTANCE bits (camera shake, lighting flicker).
+    """
+    if scene_key in _announcement_cache:
+        return scene_key
+    dhash, labels, context = scene_key
+    for key in reversed(_announcement_cache):
+        if (key[1] == labels and key[2] == context
+                and (key[0] ^ dhash).bit_count() <= ANNOUNCEMENT_MAX_HASH_DISTANCE):
+            return key
+    return None
+
+
+def _to_source_coords(objects: List[dict], frame_size: tuple, source_size: tuple) -> List[dict]:
+    """Scale bbox/center of detection dicts from a reduced frame back to the source image."""
+    (frame_h, frame_w), (source_h, source_w) = frame_size, source_size
+    if (frame_h, frame_w) == (source_h, source_w):
+        return objects
+    sx, sy = source_w / frame_w, source_h / frame_h
+    return [
+        {
+            **o,
+            "bbox": (
+                min(round(o["bbox"][0] * sx), source_w), min(round(o["bbox"][1] * sy), source_h),
+                min(round(o["bbox"][2] * sx), source_w), min(round(o["bbox"][3] * sy), source_h),
+            ),
+            "center": (min(round(o["center"][0] * sx), source_w), min(round(o["center"][1] * sy), source_h)),
+        }
+        for o in objects
+    ]
+
+
+def _classify_key(detection_dicts: List[dict]) -> tuple:
+    """
+    Coarse fingerprint of a frame's detections: label, all four bbox
+    coordinates on a 10 px grid (classify_all reads the full box for
+    corridor coverage and the distance fallback), distance to 0.1 m.
+    Frames with the same key classify the same, so classify_all can be
+    skipped.
+    """
+    return tuple(
+        (
+            d["label"],
+            *(v // 10 for v in d["bbox"]),
+            round(d["distance"], 1) if d["distance"] is not None else None,
+        )
+        for d in detection_dicts
+    )
+
+
+def _decode_frame_message(data) -> Optional[np.ndarray]:
+    """Decode a /ws/video message (raw JPEG bytes or base64 text) to a BGR frame."""
+    image_bytes = data if isinstance(data, bytes) else b64decode(data, validate=True)
+    return decode_jpeg(image_bytes, max_side=STREAM_MAX_SIDE)
+
+
+def _annotate_and_encode(
+    encoder: Union[JpegEncoder, WebpEncoder],
+    frame: np.ndarray,
+    detections: List[DetectedObject],
+) -> memoryview:
+    """
+    Draw bounding boxes (if any) and encode with the connection's encoder.
+
+    Draws on ``frame`` itself — the stream has no further use for the
+    clean frame, so no per-frame copy is allocated.
+    """
+    if detections:
+        detector.draw_detections(frame, detections, in_place=True)
+    return encoder.encode(frame)
+
+
+def _encode_annotated(frame: np.ndarray, detections: List[DetectedObject]) -> str:
+    """Draw bounding boxes and return the annotated frame as base64 JPEG."""
+    annotated = detector.draw_detections(frame, detections)
+    return b64encode(encode_jpeg(annotated))
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -178,29 +427,20 @@ async def detect_objects(
     if detector is None:
         raise HTTPException(status_code=503, detail="Detector not loaded")
     
-    # Read image
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # Read + decode image (offload to thread pool to avoid blocking event loop)
+    contents = await _read_upload(file)
+    frame = await asyncio.to_thread(decode_jpeg, contents)
     
     if frame is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
     
-    # Detect objects (offload to thread pool to avoid blocking event loop)
-    detections = await asyncio.to_thread(detector.detect, frame)
-    
-    # Estimate depth/distance if available
-    if estimate_depth and depth_estimator is not None:
-        depth_map, _ = await asyncio.to_thread(depth_estimator.estimate, frame)
-        for det in detections:
-            det.distance = depth_estimator.get_distance_for_bbox(depth_map, det.bbox)
+    # Detect objects + estimate distances (offloaded, run concurrently)
+    detections = await _detect_and_measure(frame, estimate_depth)
     
-    # Draw bounding boxes
+    # Draw bounding boxes (offloaded)
     frame_base64 = None
     if draw_boxes:
-        annotated = detector.draw_detections(frame, detections)
-        _, buffer = cv2.imencode('.jpg', annotated)
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
+        frame_base64 = await asyncio.to_thread(_encode_annotated, frame, detections)
     
     return DetectionResponse(
         objects=[det.to_dict() for det in detections],
@@ -208,6 +448,13 @@ async def detect_objects(
     )
 
 
+async def _prepend_chunk(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Re-attach an already-read first chunk to the rest of a stream."""
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
 @app.post("/announce")
 async def announce_surroundings(request: AnnouncementRequest):
     """
@@ -218,15 +465,22 @@ async def announce_surroundings(request: AnnouncementRequest):
     
     Returns audio as streaming response.
     """
+    # Collapse whitespace — blank text never reaches (or bills) ElevenLabs
+    text = " ".join(request.text.split())
+    if not text:
+        raise HTTPException(status_code=400, detail="Nothing to announce")
+    
     try:
-        print(f"🔊 Announce request: '{request.text}'")
-        audio_data = await generate_voice_and_track_cost(
-            text=request.text,
+        print(f"🔊 Announce request: '{text}'")
+        audio_stream = stream_voice_and_track_cost(
+            text=text,
             voice_id=request.voice_id or "JBFqnCBsd6RMkjVDRZzb",  # Default: calm voice
         )
+        # Pull the first chunk here so TTS failures still surface as a 500
+        first_chunk = await audio_stream.__anext__()
         
         return StreamingResponse(
-            io.BytesIO(audio_data),
+            _prepend_chunk(first_chunk, audio_stream),
             media_type="audio/mpeg",
             headers={"Content-Disposition": "attachment; filename=announcement.mp3"}
         )
@@ -242,7 +496,6 @@ async def navigate(request: NavigateRequest):
     Parse navigation intent (start + destination) and return path.
     User can say: 'I am in room 0020, take me to room 0010'
     """
-    classifier = get_classifier()
     intent = await classifier.get_navigation_intent(request.text)
 
     destination = intent.get("destination")
@@ -260,8 +513,6 @@ async def navigate(request: NavigateRequest):
             "intent": intent
         }, status_code=400)
 
-    pathfinder = get_pathfinder()
-
     # Check rooms are known
     available = pathfinder.get_available_rooms()
     if not available:
@@ -308,7 +559,6 @@ async def navigate(request: NavigateRequest):
 @app.get("/rooms")
 async def list_rooms():
     """Return all known rooms from the map analysis."""
-    pathfinder = get_pathfinder()
     rooms = pathfinder.get_available_rooms()
     return {"rooms": rooms}
 
@@ -322,7 +572,6 @@ async def reanalyze_map():
     try:
         analyzer = get_map_analyzer()
         analysis = await analyzer.get_or_create_analysis(svg_path, force=True)
-        pathfinder = get_pathfinder()
         pathfinder.load_from_analysis(analysis)
         return {
             "status": "ok",
@@ -337,62 +586,73 @@ async def reanalyze_map():
 @app.post("/analyze-and-announce")
 async def analyze_and_announce(
     file: UploadFile = File(...),
-    navigation_context: Optional[str] = ""
+    navigation_context: Optional[str] = "",
+    return_annotated: bool = True,
 ):
     """
     Detect objects, calculate distances, and generate voice announcement.
     
     Returns:
-    - Detected objects with distances
-    - Annotated frame
+    - Detected objects with distances (bbox/center in the upload's pixel
+      coordinates)
+    - Annotated frame, at the reduced decode size (null when
+      ``return_annotated=false``)
     - Voice announcement describing the scene
     """
     if detector is None:
         raise HTTPException(status_code=503, detail="Detector not loaded")
     
-    # Read image
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # Read + decode image (offload to thread pool); Gemini still gets the
+    # original upload bytes, so reducing here only trims local CV work
+    contents = await _read_upload(file)
+    frame, (source_h, source_w) = await asyncio.to_thread(
+        decode_jpeg_sized, contents, STREAM_MAX_SIDE
+    )
     
     if frame is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
     
-    # Detect objects (offload to thread pool)
-    detections = await asyncio.to_thread(detector.detect, frame)
-    
-    # Estimate distances (offload to thread pool)
-    if depth_estimator is not None:
-        depth_map, _ = await asyncio.to_thread(depth_estimator.estimate, frame)
-        for det in detections:
-            det.distance = depth_estimator.get_distance_for_bbox(depth_map, det.bbox)
+    # Detect objects + estimate distances (offloaded, run concurrently)
+    detections = await _detect_and_measure(frame)
     
     # Generate announcement using Gemini reasoning
-    classifier = get_classifier()
     detection_dicts = [det.to_dict() for det in detections]
-    
-    # Use async Gemini visual reasoning
-    # Convert BGR frame to RGB PIL Image
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    pil_image = Image.fromarray(rgb_frame)
+    classified = None  # classify_all output, computed at most once
     
     # ── Run scene reasoning AND braille detection IN PARALLEL ──
     # This adds zero extra latency — both calls execute concurrently.
     # return_exceptions=True ensures braille errors NEVER break the normal announcement.
-    braille_reader = get_braille_reader()
 
     # Pass navigation destination to braille reader for context-aware detection
     if navigation_context:
-        import re
-        dest_match = re.search(r'room\s*(\w+)', navigation_context, re.IGNORECASE)
+        dest_match = _ROOM_RE.search(navigation_context)
         braille_reader.set_navigation_context(dest_match.group(1) if dest_match else None)
     
-    announcement_task = classifier.reason_with_gemini(
-        detection_dicts, 
-        image_data=pil_image,
-        navigation_context=navigation_context
+    # A static (or nearly static) scene with the same objects gets the same
+    # announcement — reuse it instead of paying for another Gemini round-trip.
+    scene_key = (
+        frame_dhash(frame),
+        _label_mask(detection_dicts),
+        navigation_context,
     )
-    braille_task = braille_reader.detect_and_read(pil_image)
+    cached_key = _find_cached_announcement(scene_key)
+    cached_announcement = _announcement_cache[cached_key] if cached_key else None
+    if cached_announcement is not None:
+        _announcement_cache.move_to_end(cached_key)
+        announcement_task = asyncio.sleep(0, result=cached_announcement)
+    else:
+        # Uploads are normally JPEG already — forward them untouched; only
+        # re-encode other formats (libjpeg-turbo, off the loop)
+        gemini_jpeg = (
+            contents if contents[:2] == b"\xff\xd8"
+            else await asyncio.to_thread(encode_jpeg, frame, 75)
+        )
+        announcement_task = classifier.reason_with_gemini(
+            detection_dicts, 
+            image_data=gemini_jpeg,
+            navigation_context=navigation_context
+        )
+    braille_task = braille_reader.detect_and_read(frame)
     
     results = await asyncio.gather(
         announcement_task, braille_task,
@@ -405,7 +665,14 @@ async def analyze_and_announce(
     
     if isinstance(announcement, BaseException):
         print(f"⚠️ Scene reasoning failed: {announcement}")
-        announcement = classifier.generate_navigation_instruction(detection_dicts)
+        classified = classifier.classify_all(detection_dicts)
+        announcement = classifier.generate_navigation_instruction(
+            detection_dicts, classified=classified
+        )
+    elif cached_announcement is None:
+        _announcement_cache[scene_key] = announcement
+        if len(_announcement_cache) > ANNOUNCEMENT_CACHE_SIZE:
+            _announcement_cache.popitem(last=False)
     
     if isinstance(braille_text, BaseException):
         print(f"⚠️ Braille detection failed: {braille_text}")
@@ -419,14 +686,22 @@ async def analyze_and_announce(
         )
         print(f"⠿ Braille detected: {braille_text}")
     
-    # Draw boxes
-    annotated = detector.draw_detections(frame, detections)
-    _, buffer = cv2.imencode('.jpg', annotated)
-    frame_base64 = base64.b64encode(buffer).decode('utf-8')
+    # Draw boxes (offloaded) — skipped for clients that render their own
+    frame_base64 = (
+        await asyncio.to_thread(_encode_annotated, frame, detections)
+        if return_annotated else None
+    )
     
     # Classify detections for response (ensure JSON-serializable, e.g. no numpy float32)
-    classified = classifier.classify_all(detection_dicts)
-    objects_serializable = _make_json_serializable(classified)
+    if classified is None:
+        classified = classifier.classify_all(detection_dicts)
+    # ORJSONResponse serialises numpy itself; only the stdlib fallback needs the walk
+    # Report boxes in the upload's coordinates, like /detect (classification
+    # above ran on the reduced frame the boxes were found in)
+    classified = _to_source_coords(classified, frame.shape[:2], (source_h, source_w))
+    objects_serializable = (
+        classified if orjson is not None else _make_json_serializable(classified)
+    )
     
     return JSONResponse({
         "objects": objects_serializable,
@@ -436,49 +711,117 @@ async def analyze_and_announce(
     })
 
 
+def _dumps(data: dict) -> str:
+    """
+    Encode a WebSocket JSON message, with orjson when it is installed.
+
+    numpy scalars/arrays may be passed as-is: orjson serialises them
+    natively, and the stdlib fallback converts them first.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(_make_json_serializable(data), separators=(",", ":"), ensure_ascii=False)
+
+
+async def _send_json(websocket: WebSocket, data: dict):
+    """Send a JSON text message (see _dumps)."""
+    await websocket.send_text(_dumps(data))
+
+
+def _put_latest(mailbox: asyncio.Queue, item):
+    """Put into a single-slot queue, replacing whatever is still waiting there."""
+    if mailbox.full():
+        mailbox.get_nowait()
+    mailbox.put_nowait(item)
+
+
+async def _receive_frame(websocket: WebSocket):
+    """
+    Receive the next frame from a camera client.
+
+    Returns raw JPEG bytes for binary messages, or the base64 string for
+    text messages. Raises WebSocketDisconnect when the client goes away.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message.get("text") or ""
+
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
         print(f"📱 Client connected. Total: {len(self.active_connections)}")
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
         print(f"📱 Client disconnected. Total: {len(self.active_connections)}")
 
 
 # Viewer connection manager (for dashboard viewers)
 class ViewerManager:
+    """
+    Dashboard viewers, each fed by its own sender task.
+    
+    broadcast() only drops the update into every viewer's single-slot
+    mailbox: a slow viewer skips stale frames instead of queueing them, and
+    never holds up the camera client or the other viewers.
+    """
+    
     def __init__(self):
-        self.viewers: List[WebSocket] = []
+        self.viewers: Dict[WebSocket, asyncio.Queue] = {}
+        self._senders: Dict[WebSocket, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.viewers.append(websocket)
+        mailbox: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.viewers[websocket] = mailbox
+        sender = asyncio.create_task(self._send_loop(websocket, mailbox))
+        sender.add_done_callback(lambda task: self._sender_done(websocket, task))
+        self._senders[websocket] = sender
         print(f"👁️  Viewer connected. Total: {len(self.viewers)}")
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.viewers:
-            self.viewers.remove(websocket)
+        if self.viewers.pop(websocket, None) is None:
+            return
+        self._senders.pop(websocket).cancel()  # no-op if it already finished
         print(f"👁️  Viewer disconnected. Total: {len(self.viewers)}")
     
-    async def broadcast(self, data: dict):
-        """Send data to all connected viewers."""
+    def broadcast(self, data: dict, frame: Optional[bytes] = None):
+        """
+        Queue data for all connected viewers.
+        
+        If given, the annotated frame follows the JSON as a binary message,
+        same as for binary /ws/video clients.
+        """
         if not self.viewers:
             return
-        disconnected = []
-        for viewer in self.viewers:
-            try:
-                await viewer.send_json(data)
-            except Exception:
-                disconnected.append(viewer)
-        for v in disconnected:
-            self.disconnect(v)
+        # Encode once for every viewer
+        update = (_dumps(data), frame)
+        for mailbox in self.viewers.values():
+            _put_latest(mailbox, update)
+    
+    async def _send_loop(self, websocket: WebSocket, mailbox: asyncio.Queue):
+        """Deliver the latest update to one viewer at its own pace."""
+        while True:
+            payload, frame = await mailbox.get()
+            await websocket.send_text(payload)
+            if frame is not None:
+                await websocket.send_bytes(frame)
+    
+    def _sender_done(self, websocket: WebSocket, task: asyncio.Task):
+        """A sender that died (broken socket) takes its viewer with it."""
+        if task.cancelled():
+            return  # stopped by disconnect()
+        print(f"👁️  Viewer send failed: {task.exception()!r}")
+        self.disconnect(websocket)
 
 
 manager = ConnectionManager()
@@ -490,15 +833,28 @@ async def websocket_video(websocket: WebSocket):
     """
     WebSocket endpoint for real-time video processing.
     
-    Client sends: base64-encoded JPEG frames
-    Server sends: JSON with detections + annotated frame base64
+    Client sends: JPEG frames, either as binary messages or base64 text
+    Server sends: JSON with detections + annotated frame base64 (text clients),
+                  or a JSON metadata message followed by the raw annotated image
+                  as a binary message (binary clients — no base64 either way)
+    
+    Connect with ``?format=webp`` to receive annotated frames as WebP instead
+    of JPEG (smaller on the wire, more encode CPU); ``frame_format`` in each
+    metadata message says which one was sent. Clients that draw the boxes
+    themselves connect with ``?draw=0`` and get metadata messages only; frames
+    are then annotated and encoded only while a dashboard viewer is attached.
     
     Performance strategy — smooth video, throttled depth:
-    - Every frame: YOLO detection + draw annotations + encode → always send frame_base64
+    - Every frame: YOLO detection + draw annotations + encode → always send the frame
     - Depth (MiDaS): runs on a *time-based* cooldown so it never blocks consecutive
       frames.  Between depth runs the cached depth map is re-used for distance lookups.
     - Instruction text: cached and only regenerated when detected labels change.
-    - Frame dropping: stale queued frames are drained so only the latest is processed.
+    - Frame dropping: a receiver task keeps only the newest unprocessed frame, so
+      a slow pipeline skips stale frames instead of falling behind live.
+    - Pipelining: frame N is annotated and encoded while frame N+1 is
+      received and run through detection.
+    - Send coalescing: a sender task delivers only the newest unsent result, so a
+      slow client (or viewer) never stalls processing of the next frame.
     """
     await manager.connect(websocket)
     
@@ -511,103 +867,164 @@ async def websocket_video(websocket: WebSocket):
     cached_depth_map    = None
     cached_instruction  = ""
     cached_classified   = []
-    cached_label_set    = set()
+    cached_label_mask   = 0     # _label_mask() of the cached instruction's input
     last_depth_time     = 0.0   # monotonic timestamp of last depth calc
+    cached_classify_key = ()    # _classify_key() of cached_classified's input
+    frame_format        = "webp" if websocket.query_params.get("format") == "webp" else "jpeg"
+    draw_boxes          = websocket.query_params.get("draw") != "0"
+    frame_encoder       = (
+        WebpEncoder(quality=50) if frame_format == "webp"
+        else JpegEncoder(quality=45)
+    )
+    
+    # ── Inbound mailbox — holds only the newest unprocessed frame ──
+    latest_frame: asyncio.Queue = asyncio.Queue(maxsize=1)
+    
+    # ── Outbound mailbox — holds only the newest unsent (metadata, frame, delivery) ──
+    # delivery: "binary" / "base64" = how the client gets the frame, None = it doesn't
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=1)
+    
+    async def receive_frames():
+        """Read frames as they arrive, replacing any frame not yet processed."""
+        try:
+            while True:
+                _put_latest(latest_frame, await _receive_frame(websocket))
+        except Exception:
+            # Disconnected (or broken socket) — wake the processing loop
+            _put_latest(latest_frame, None)
+    
+    async def send_results():
+        """Deliver results to the client, then to dashboard viewers."""
+        while True:
+            metadata, frame_bytes, delivery = await outbox.get()
+            if delivery == "base64":
+                await _send_json(websocket, {**metadata, "frame_base64": b64encode(frame_bytes)})
+            else:
+                await _send_json(websocket, metadata)
+                if delivery == "binary":
+                    # The image follows its metadata as its own message
+                    await websocket.send_bytes(frame_bytes)
+            
+            # ── 9. Broadcast to dashboard viewers (always binary) ──
+            if frame_bytes is not None:
+                viewer_manager.broadcast(metadata, frame_bytes)
+    
+    async def encode_and_queue(frame, detections, response_data, delivery):
+        """Annotate + encode off the loop, then hand off to the sender task."""
+        try:
+            buffer = await asyncio.to_thread(
+                _annotate_and_encode, frame_encoder, frame, detections
+            )
+        except Exception as e:
+            # Always answer — clients with backpressure wait for a reply
+            # before sending their next frame
+            print(f"⚠️ Frame encode failed: {e}")
+            _put_latest(outbox, ({**response_data, "error": f"Could not encode frame: {e}"}, None, None))
+            return
+        # ── 8. Send — replacing any unsent result ──
+        # bytes for the outbox (the cv2 path returns a view of its array)
+        _put_latest(outbox, (response_data, bytes(buffer), delivery))
+    
+    receiver = asyncio.create_task(receive_frames())
+    sender = asyncio.create_task(send_results())
+    encode_task: Optional[asyncio.Task] = None  # previous frame's encode_and_queue
     
     try:
         while True:
-            # ── 1. Drain queue — keep only the freshest frame ──
-            data = await websocket.receive_text()
-            while True:
-                try:
-                    newer = await asyncio.wait_for(
-                        websocket.receive_text(), timeout=0.001
-                    )
-                    data = newer          # drop the older frame
-                except asyncio.TimeoutError:
-                    break
+            # ── 1. Take the freshest frame — older ones were already dropped ──
+            data = await latest_frame.get()
+            if data is None:
+                raise WebSocketDisconnect()
             
-            # ── 2. Decode ──
+            # ── 2. Decode — binary frames skip base64 entirely (offloaded) ──
+            binary_client = isinstance(data, bytes)
+            if len(data) > MAX_FRAME_BYTES:
+                _put_latest(outbox, ({"error": "Frame too large"}, None, None))
+                continue
             try:
-                image_bytes = base64.b64decode(data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                frame = await asyncio.to_thread(_decode_frame_message, data)
             except Exception as e:
-                await websocket.send_json({"error": f"Invalid frame: {e}"})
+                _put_latest(outbox, ({"error": f"Invalid frame: {e}"}, None, None))
                 continue
             
             if frame is None:
-                await websocket.send_json({"error": "Could not decode frame"})
+                _put_latest(outbox, ({"error": "Could not decode frame"}, None, None))
                 continue
             
             frame_count += 1
             now = time.monotonic()
             
-            # ── 3. Detection — every frame (YOLOv8n, ~30-50 ms, offloaded) ──
+            # ── 3. Detection — every frame (YOLOv8n, ~30-50 ms, batched across clients) ──
             detections = (
-                await asyncio.to_thread(detector.detect, frame)
-                if detector else []
+                await detection_batcher.detect(frame)
+                if detection_batcher else []
             )
             
-            # ── 4. Depth — only when cooldown has elapsed (offloaded) ──
+            # ── 4. Depth — only when cooldown has elapsed (offloaded, batched on GPU) ──
             if (depth_estimator is not None
                     and detections
                     and (now - last_depth_time) >= DEPTH_COOLDOWN_S):
-                cached_depth_map, _ = await asyncio.to_thread(
-                    depth_estimator.estimate, frame
-                )
+                cached_depth_map = await _estimate_depth_async(frame)
                 last_depth_time = now
             
             # Re-use cached depth map for fast per-bbox distance lookup (~<1 ms)
             if cached_depth_map is not None and detections:
-                for det in detections:
-                    det.distance = depth_estimator.get_distance_for_bbox(
-                        cached_depth_map, det.bbox
-                    )
+                _apply_distances(cached_depth_map, detections)
             
-            # ── 5. Classify (cheap) ──
+            # ── 5. Classify — only when labels, coarse positions or distances moved ──
             detection_dicts = [det.to_dict() for det in detections]
-            classifier = get_classifier()
-            classified = classifier.classify_all(detection_dicts)
-            cached_classified = classified
-            
-            # ── 6. Annotate + encode — every frame for smooth video ──
-            annotated = (
-                detector.draw_detections(frame, detections)
-                if detections else frame
-            )
-            _, buffer = cv2.imencode(
-                '.jpg', annotated,
-                [cv2.IMWRITE_JPEG_QUALITY, 45]
-            )
-            frame_b64 = base64.b64encode(buffer).decode('utf-8')
+            current_labels = _label_mask(detection_dicts)
+            classify_key = _classify_key(detection_dicts)
+            if classify_key != cached_classify_key:
+                cached_classified = classifier.classify_all(detection_dicts)
+                cached_classify_key = classify_key
+            else:
+                # Same classification, but the response must carry this
+                # frame's exact boxes (they match the annotated image)
+                cached_classified = [
+                    {**c, "bbox": d["bbox"], "center": d["center"], "confidence": d["confidence"]}
+                    for c, d in zip(cached_classified, detection_dicts)
+                ]
             
-            # ── 7. Instruction — cache until labels change ──
-            current_labels = frozenset(d.get("label", "") for d in classified)
-            if (current_labels != cached_label_set
+            # ── 6. Instruction — cache until labels change ──
+            if (current_labels != cached_label_mask
                     or frame_count % INSTRUCTION_EVERY_N == 0
                     or not cached_instruction):
                 cached_instruction = classifier.generate_navigation_instruction(
-                    detection_dicts
+                    detection_dicts, classified=cached_classified
                 )
-                cached_label_set = current_labels
+                cached_label_mask = current_labels
             
-            # ── 8. Send — always includes frame_base64 for smooth playback ──
+            # ── 7. Annotate + encode — overlapped with the next frame, and only
+            #       when someone will see the image ──
+            # Results must stay in order, so the previous encode must
+            # finish first
+            if encode_task is not None:
+                await encode_task
+                encode_task = None
             response_data = {
-                "objects": _make_json_serializable(cached_classified),
-                "frame_base64": frame_b64,
+                "objects": cached_classified,  # numpy handled by _send_json
                 "instruction": cached_instruction,
+                "frame_format": frame_format,
             }
-            await websocket.send_json(response_data)
-            
-            # ── 9. Broadcast to dashboard viewers ──
-            await viewer_manager.broadcast(response_data)
+            delivery = ("binary" if binary_client else "base64") if draw_boxes else None
+            if draw_boxes or viewer_manager.viewers:
+                encode_task = asyncio.create_task(
+                    encode_and_queue(frame, detections, response_data, delivery)
+                )
+            else:
+                _put_latest(outbox, (response_data, None, None))
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
+    finally:
+        receiver.cancel()
+        sender.cancel()
+        if encode_task is not None:
+            encode_task.cancel()
 
 
 @app.websocket("/ws/viewer")
@@ -618,6 +1035,8 @@ async def websocket_viewer(websocket: WebSocket):
     Viewers receive the same processed frames and detections as the camera
     client, broadcast in real-time from /ws/video. This allows the dashboard
     to display the phone's camera feed without opening a local webcam.
+    Each update is a JSON metadata message followed by the annotated image
+    as a binary message.
     
     The viewer does NOT send frames — it only receives.
     """
@@ -629,11 +1048,13 @@ async def websocket_viewer(websocket: WebSocket):
             try:
                 await asyncio.wait_for(websocket.receive_text(), timeout=30)
             except asyncio.TimeoutError:
-                # Send a keepalive ping
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception:
-                    break
+                # Send a keepalive ping — via the viewer's sender task, so it
+                # never lands between a metadata message and its frame
+                mailbox = viewer_manager.viewers.get(websocket)
+                if mailbox is None:
+                    break  # sender failed, viewer already dropped
+                if mailbox.empty():
+                    mailbox.put_nowait((_dumps({"type": "ping"}), None))
     except WebSocketDisconnect:
         viewer_manager.disconnect(websocket)
     except Exception as e:
@@ -644,17 +1065,39 @@ async def websocket_viewer(websocket: WebSocket):
 if __name__ == "__main__":
     import uvicorn
     
+    # uvloop (libuv) is faster than the stdlib loop but has no Windows build
+    try:
+        import uvloop  # noqa: F401
+        loop_impl = "uvloop"
+    except ImportError:
+        loop_impl = "asyncio"
+    
     # Get port from env or default to 8000
     port = int(os.getenv("PORT", 8000))
+    # Viewer broadcast state lives in-process, so a viewer only sees camera
+    # clients on its own worker — keep 1 unless behind sticky sessions
+    # (e.g. WEB_CONCURRENCY=$(nproc) with an IP-hash load balancer).
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
     
     print(f"\n🌐 Starting server on http://0.0.0.0:{port}")
     print(f"📱 For phone access, use your computer's local IP address")
     print(f"   Example: http://192.168.x.x:{port}")
     
     uvicorn.run(
-        app,
+        "main:app" if workers > 1 else app,  # Multiple workers need an import string
         host="0.0.0.0",  # Allow external connections
         port=port,
         reload=False,  # Disable reload for production
+        loop=loop_impl,
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,  # Payloads are JPEG — deflate only burns CPU
+        ws_max_size=MAX_FRAME_BYTES + 1024,  # Oversized frames close the socket at the protocol layer
+        ws_max_queue=4,  # The receiver task drains continuously; don't buffer 32 stale frames
+        ws_ping_interval=10.0,  # Detect dead phones (sleep, network switch) quickly
+        ws_ping_timeout=10.0,
+        workers=workers,
+        backlog=2048,  # Absorb reconnect bursts from many phones at once
+        limit_concurrency=int(os.getenv("LIMIT_CONCURRENCY", 1000)),  # 503 beyond this
         timeout_keep_alive=30,  # Close idle keep-alive connections after 30s
     )
@@ -5,7 +5,11 @@ Export detection, depth, TTS, and reasoning services.
 
 from .detection import ObjectDetector, DetectedObject, get_detector
 from .depth import DepthEstimator, get_depth_estimator
-from .tts import generate_voice_and_track_cost, generate_obstacle_announcement
+from .tts import (
+    generate_voice_and_track_cost,
+    stream_voice_and_track_cost,
+    generate_obstacle_announcement,
+)
 from .reasoning import ObstacleClassifier, get_classifier
 
 __all__ = [
@@ -15,6 +19,7 @@ __all__ = [
     "DepthEstimator",
     "get_depth_estimator",
     "generate_voice_and_track_cost",
+    "stream_voice_and_track_cost",
     "generate_obstacle_announcement",
     "ObstacleClassifier",
     "get_classifier",
@@ -0,0 +1,73 @@
+"""
+Micro-batching for model inference shared by many WebSocket connections.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls from many connections into
+    batched model calls.
+
+    A single background task owns the model: it takes every item that
+    queued up while the previous batch was running (up to max_batch) and
+    runs them together. A lone client never waits on a batching timer.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], max_batch: int = 4):
+        """
+        Args:
+            run_batch: Blocking function mapping a list of inputs to a list of
+                outputs in the same order (run in a worker thread)
+            max_batch: Largest batch handed to run_batch
+        """
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the batching task (call from a running event loop)."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an input and wait for its output."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # Callers that gave up (disconnected) are dropped from the batch
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await asyncio.to_thread(
+                    self.run_batch, [item for item, _ in batch]
+                )
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
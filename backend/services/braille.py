@@ -75,7 +75,8 @@ class BrailleReader:
         Detect braille in an image and read it.
 
         Args:
-            image_data: PIL Image object
+            image_data: BGR frame (numpy array) as decoded by the caller —
+                no RGB/PIL conversion needed
 
         Returns:
             The English text the braille says, or None if no braille found.
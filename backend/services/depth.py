@@ -3,11 +3,62 @@ Depth estimation service using MiDaS (Monocular Depth Estimation).
 Estimates distance to detected objects for spatial awareness.
 """
 
+import os
+import threading
+import multiprocessing as mp
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
 import cv2
 import numpy as np
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import torch
 
+from .batching import MicroBatcher
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _bbox_median(depth_map: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> float:
+    """Median inverse depth over the centre 50% of a bbox (NaN if empty)."""
+    margin_x = (x2 - x1) // 4
+    margin_y = (y2 - y1) // 4
+    region = depth_map[y1 + margin_y : y2 - margin_y, x1 + margin_x : x2 - margin_x]
+    if region.size == 0:
+        return np.nan
+    return np.median(region)
+
+
+if NUMBA_AVAILABLE:
+    # Compiled once (cached on disk), runs without the GIL
+    _bbox_median = njit(cache=True, nogil=True)(_bbox_median)
+
+
+def _bbox_medians(depth_map: np.ndarray, bboxes: np.ndarray) -> np.ndarray:
+    """_bbox_median for each row of an (N, 4) bbox array."""
+    medians = np.empty(bboxes.shape[0], dtype=np.float64)
+    for i in range(bboxes.shape[0]):
+        medians[i] = _bbox_median(
+            depth_map, bboxes[i, 0], bboxes[i, 1], bboxes[i, 2], bboxes[i, 3]
+        )
+    return medians
+
+
+if NUMBA_AVAILABLE:
+    # One compiled call for all boxes — serial: at most a handful of boxes
+    # per frame, far too few to pay for a thread-pool launch
+    _bbox_medians = njit(cache=True, nogil=True)(_bbox_medians)
+
+
+def warmup_bbox_medians():
+    """Compile (or load from cache) _bbox_medians ahead of the first frame."""
+    _bbox_medians(np.zeros((8, 8), dtype=np.float32), np.array([[0, 0, 8, 8]], dtype=np.int32))
+
 
 class DepthEstimator:
     """
@@ -15,6 +66,9 @@ class DepthEstimator:
     Converts 2D images to relative depth maps.
     """
     
+    # Largest batch a TensorRT engine must accept (see DepthBatcher)
+    EXPORT_MAX_BATCH = 4
+    
     def __init__(self, model_type: str = "MiDaS_small"):
         """
         Initialize depth estimator.
@@ -26,6 +80,17 @@ class DepthEstimator:
         self.model = None
         self.transform = None
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # On CUDA: FP16 weights, and a dedicated stream so depth can overlap
+        # with YOLO (which stays on the default stream)
+        self.half = self.device.type == "cuda"
+        self.stream: Optional["torch.cuda.Stream"] = None
+        # Page-locked upload buffers (one per batch slot), reused across
+        # frames of the same shape; the lock keeps concurrent callers from
+        # overwriting them mid-upload
+        self._pinned: Dict[int, "torch.Tensor"] = {}
+        self._pinned_lock = threading.Lock()
+        # Normalisation constants as (1, 3, 1, 1) device tensors, built once
+        self._mean_std: Optional[Tuple["torch.Tensor", "torch.Tensor"]] = None
         
         # Calibration factor to convert relative depth to meters
         # This needs to be calibrated for your specific camera
@@ -38,6 +103,15 @@ class DepthEstimator:
             self.model = torch.hub.load("intel-isl/MiDaS", self.model_type)
             self.model.to(self.device)
             self.model.eval()
+            if self.half:
+                # NHWC is what cuDNN's FP16 tensor-core convolutions want
+                self.model.half().to(memory_format=torch.channels_last)
+                self.stream = torch.cuda.Stream(device=self.device)
+                # Input shape is fixed on CUDA, so cuDNN's autotuned kernels stick
+                torch.backends.cudnn.benchmark = True
+                self.model = self._load_traced()
+                if os.getenv("USE_TRT") == "1":
+                    self.model = self._load_trt(self.model)
             
             # Load transforms
             midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
@@ -46,11 +120,103 @@ class DepthEstimator:
             else:
                 self.transform = midas_transforms.dpt_transform
             
-            print(f"✓ MiDaS {self.model_type} loaded on {self.device}")
+            precision = "fp16" if self.half else "fp32"
+            print(f"✓ MiDaS {self.model_type} loaded on {self.device} ({precision})")
         except Exception as e:
             print(f"✗ Failed to load MiDaS: {e}")
             raise
     
+    @property
+    def _net_params(self) -> Tuple[int, tuple, tuple]:
+        """(input size, mean, std) the MiDaS variant was trained with."""
+        if self.model_type == "MiDaS_small":
+            return 256, (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+        return 384, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)
+    
+    def _load_traced(self) -> torch.nn.Module:
+        """
+        FP16 TorchScript version of the model at its fixed square input size,
+        traced once and cached on disk. Falls back to the eager model if
+        tracing fails.
+        """
+        net_size = self._net_params[0]
+        path = f"midas_{self.model_type}_fp16_cl_{net_size}.ts"
+        try:
+            if os.path.exists(path):
+                return torch.jit.load(path, map_location=self.device)
+            example = torch.zeros(
+                1, 3, net_size, net_size, device=self.device, dtype=torch.float16
+            ).contiguous(memory_format=torch.channels_last)
+            with torch.inference_mode():
+                traced = torch.jit.trace(self.model, example)
+            traced = torch.jit.freeze(traced.eval())
+            traced.save(path)
+            return traced
+        except Exception as e:
+            print(f"⚠️  TorchScript trace failed, using eager MiDaS: {e}")
+            return self.model
+    
+    def _load_trt(self, traced: torch.nn.Module) -> torch.nn.Module:
+        """
+        TensorRT FP16 engine built from the traced model (via torch-tensorrt)
+        for batches of 1..EXPORT_MAX_BATCH, compiled once and cached on disk.
+        Falls back to the traced model if torch-tensorrt is missing or the
+        build fails.
+        """
+        net_size = self._net_params[0]
+        path = f"midas_{self.model_type}_trt_fp16_{net_size}.ts"
+        try:
+            if os.path.exists(path):
+                return torch.jit.load(path, map_location=self.device)
+            import torch_tensorrt
+            print(f"⏳ Building TensorRT engine for MiDaS {self.model_type} (one-time)...")
+            engine = torch_tensorrt.compile(
+                traced,
+                ir="torchscript",
+                inputs=[torch_tensorrt.Input(
+                    min_shape=(1, 3, net_size, net_size),
+                    opt_shape=(1, 3, net_size, net_size),
+                    max_shape=(self.EXPORT_MAX_BATCH, 3, net_size, net_size),
+                    dtype=torch.half,
+                )],
+                enabled_precisions={torch.half},
+            )
+            torch.jit.save(engine, path)
+            return engine
+        except Exception as e:
+            print(f"⚠️  TensorRT build failed, using TorchScript MiDaS: {e}")
+            return traced
+    
+    def _preprocess_on_device(self, frame: np.ndarray, slot: int = 0) -> "torch.Tensor":
+        """
+        GPU equivalent of the MiDaS torch.hub transform.
+        
+        Copies the uint8 BGR frame into a reused pinned buffer and uploads
+        it asynchronously, then does BGR→RGB, scaling to [0, 1], the resize
+        to the net's fixed square input and mean/std normalisation on the
+        device — no per-pixel CPU work. The output is resized back to the
+        frame's aspect ratio afterwards, so the squash does not leak out.
+        """
+        net_size, mean, std = self._net_params
+        
+        pinned = self._pinned.get(slot)
+        if pinned is None or pinned.shape != frame.shape:
+            pinned = self._pinned[slot] = torch.empty(frame.shape, dtype=torch.uint8).pin_memory()
+        pinned.numpy()[:] = frame
+        
+        tensor = pinned.to(self.device, non_blocking=True)
+        tensor = tensor.permute(2, 0, 1).flip(0).unsqueeze(0).float().div_(255.0)
+        tensor = torch.nn.functional.interpolate(
+            tensor, size=(net_size, net_size), mode="bicubic", align_corners=False
+        )
+        if self._mean_std is None:
+            self._mean_std = (
+                torch.tensor(mean, device=self.device).view(1, 3, 1, 1),
+                torch.tensor(std, device=self.device).view(1, 3, 1, 1),
+            )
+        mean_t, std_t = self._mean_std
+        return tensor.sub_(mean_t).div_(std_t)
+    
     def estimate(self, frame: np.ndarray) -> np.ndarray:
         """
         Estimate depth map from image.
@@ -63,32 +229,74 @@ class DepthEstimator:
         """
         if self.model is None:
             self.load_model()
+        if self.device.type == "cuda":
+            return self.estimate_batch([frame])[0]
         
-        # Convert BGR to RGB
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Apply transforms
-        input_batch = self.transform(rgb).to(self.device)
-        
-        # Inference
-        with torch.no_grad():
-            prediction = self.model(input_batch)
+        with torch.inference_mode():
+            # Apply transforms
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            input_batch = self.transform(rgb).to(self.device)
             
-            # Resize to original size
-            prediction = torch.nn.functional.interpolate(
-                prediction.unsqueeze(1),
-                size=frame.shape[:2],
-                mode="bicubic",
-                align_corners=False,
-            ).squeeze()
-        
-        depth_map = prediction.cpu().numpy()
+            # Inference
+            prediction = self.model(input_batch)
+            depth_map = self._to_frame_size(prediction, frame.shape[:2])[0]
         
         # Normalize for visualization (0-255)
         depth_normalized = cv2.normalize(depth_map, None, 0, 255, cv2.NORM_MINMAX)
         
         return depth_map, depth_normalized.astype(np.uint8)
     
+    def estimate_batch(self, frames: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        estimate() for several frames. On CUDA they share one forward pass
+        (the net's input size is fixed, so frames of any size stack); on CPU
+        they run one after another.
+        """
+        if self.model is None:
+            self.load_model()
+        if self.device.type != "cuda":
+            return [self.estimate(frame) for frame in frames]
+        
+        stream_ctx = torch.cuda.stream(self.stream) if self.stream is not None else nullcontext()
+        with self._pinned_lock, stream_ctx, torch.inference_mode():
+            input_batch = torch.cat([
+                self._preprocess_on_device(frame, slot)
+                for slot, frame in enumerate(frames)
+            ])
+            if self.half:
+                input_batch = input_batch.half().contiguous(memory_format=torch.channels_last)
+            
+            # Inference
+            predictions = self.model(input_batch)
+            # Frames of the same size (the usual case: one camera, or
+            # STREAM_MAX_SIDE-capped decodes) share one upsample and one
+            # device→host copy
+            by_size: Dict[Tuple[int, int], List[int]] = {}
+            for i, frame in enumerate(frames):
+                by_size.setdefault(frame.shape[:2], []).append(i)
+            depth_maps: List[Optional[np.ndarray]] = [None] * len(frames)
+            for size, indices in by_size.items():
+                group = predictions if len(indices) == len(frames) else predictions[indices]
+                for i, depth_map in zip(indices, self._to_frame_size(group, size)):
+                    depth_maps[i] = depth_map
+        
+        return [
+            (depth_map, cv2.normalize(depth_map, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8))
+            for depth_map in depth_maps
+        ]
+    
+    @staticmethod
+    def _to_frame_size(predictions: "torch.Tensor", size: Tuple[int, int]) -> np.ndarray:
+        """Resize (N, H, W) predictions to the frame's size as an (N, h, w) float32 array."""
+        prediction = torch.nn.functional.interpolate(
+            predictions[:, None],
+            size=size,
+            mode="bicubic",
+            align_corners=False,
+        )[:, 0]
+        # float32 out; the device→host copy waits on the current stream
+        return prediction.float().cpu().numpy()
+    
     def get_distance_at_point(self, depth_map: np.ndarray, x: int, y: int) -> float:
         """
         Get estimated distance at a specific pixel.
@@ -129,26 +337,31 @@ class DepthEstimator:
         """
         x1, y1, x2, y2 = bbox
         
-        # Sample center 50% of bounding box
-        margin_x = (x2 - x1) // 4
-        margin_y = (y2 - y1) // 4
-        
-        region = depth_map[
-            y1 + margin_y : y2 - margin_y,
-            x1 + margin_x : x2 - margin_x,
-        ]
-        
-        if region.size == 0:
-            return float("inf")
-        
-        # Use median inverse depth
-        median_inv_depth = np.median(region)
-        if median_inv_depth > 0:
+        # Median inverse depth of the center 50% of the bounding box
+        median_inv_depth = _bbox_median(depth_map, x1, y1, x2, y2)
+        if median_inv_depth > 0:  # NaN (empty region) compares False
             distance = (1000 / median_inv_depth) * self.depth_scale
             return min(distance, 10.0)
         
         return float("inf")
     
+    def get_distances_for_bboxes(self, depth_map: np.ndarray, bboxes: np.ndarray) -> np.ndarray:
+        """
+        Vectorised get_distance_for_bbox for many boxes at once.
+        
+        Args:
+            depth_map: Output from estimate()
+            bboxes: (N, 4) int array of (x1, y1, x2, y2)
+            
+        Returns:
+            (N,) distances in meters (inf where no valid depth)
+        """
+        medians = _bbox_medians(depth_map, bboxes)
+        distances = np.full(len(medians), np.inf)
+        valid = medians > 0
+        distances[valid] = np.minimum(1000 / medians[valid] * self.depth_scale, 10.0)
+        return distances
+    
     def colorize_depth(self, depth_normalized: np.ndarray) -> np.ndarray:
         """
         Convert depth map to colorized visualization.
@@ -162,6 +375,101 @@ class DepthEstimator:
         return cv2.applyColorMap(depth_normalized, cv2.COLORMAP_MAGMA)
 
 
+class DepthBatcher(MicroBatcher):
+    """
+    Coalesces concurrent estimate() calls from many connections into
+    batched MiDaS forward passes (see MicroBatcher).
+    """
+    
+    def __init__(self, estimator: DepthEstimator, max_batch: int = 4):
+        super().__init__(estimator.estimate_batch, max_batch=max_batch)
+        self.estimator = estimator
+    
+    async def estimate(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Queue a frame and wait for its (depth_map, depth_normalized)."""
+        return await self.submit(frame)
+
+
+# ── Out-of-process depth (CPU deployments) ──
+# State that lives inside the worker process only.
+_worker_estimator: Optional[DepthEstimator] = None
+_worker_buffers: Tuple[SharedMemory, ...] = ()
+
+
+def _init_depth_worker(model_type: str, frame_shm: str, depth_shm: str):
+    """Worker initializer: load MiDaS and attach to the shared buffers."""
+    global _worker_estimator, _worker_buffers
+    _worker_estimator = DepthEstimator(model_type=model_type)
+    _worker_estimator.load_model()
+    _worker_buffers = (SharedMemory(name=frame_shm), SharedMemory(name=depth_shm))
+
+
+def _estimate_shared(shape: Tuple[int, int, int]) -> None:
+    """Worker task: read the frame from shared memory, write the depth map back."""
+    frame_buf, depth_buf = _worker_buffers
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=frame_buf.buf)
+    depth_map, _ = _worker_estimator.estimate(frame)
+    np.ndarray(shape[:2], dtype=np.float32, buffer=depth_buf.buf)[:] = depth_map
+
+
+class DepthWorker:
+    """
+    Runs MiDaS in a dedicated process so CPU inference does not contend
+    for the GIL with YOLO and the event loop.
+
+    Frames and depth maps travel through pre-allocated shared memory;
+    only the frame shape is pickled. Requests are served one at a time.
+    """
+
+    def __init__(self, model_type: str = "MiDaS_small", max_pixels: int = 1920 * 1080):
+        self.max_pixels = max_pixels
+        self._frame_shm = SharedMemory(create=True, size=max_pixels * 3)
+        self._depth_shm = SharedMemory(create=True, size=max_pixels * 4)
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_depth_worker,
+            initargs=(model_type, self._frame_shm.name, self._depth_shm.name),
+        )
+
+    def start(self):
+        """Block until the worker has loaded its model (raises if it cannot)."""
+        self._pool.submit(int).result()
+
+    def estimate(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as DepthEstimator.estimate, computed in the worker."""
+        h, w = frame.shape[:2]
+        # MiDaS works at a few hundred px anyway, so larger frames (full-res
+        # uploads) are shrunk to fit the buffers and the depth map is scaled
+        # back up afterwards
+        small = frame
+        if h * w > self.max_pixels:
+            scale = (self.max_pixels / (h * w)) ** 0.5
+            small = cv2.resize(
+                frame,
+                (max(1, int(w * scale)), max(1, int(h * scale))),
+                interpolation=cv2.INTER_AREA,
+            )
+        sh, sw = small.shape[:2]
+        with self._lock:
+            np.ndarray(small.shape, dtype=np.uint8, buffer=self._frame_shm.buf)[:] = small
+            self._pool.submit(_estimate_shared, small.shape).result()
+            # Copy out — the shared buffer is overwritten by the next request
+            depth_map = np.ndarray((sh, sw), dtype=np.float32, buffer=self._depth_shm.buf).copy()
+        if small is not frame:
+            depth_map = cv2.resize(depth_map, (w, h), interpolation=cv2.INTER_CUBIC)
+        depth_normalized = cv2.normalize(depth_map, None, 0, 255, cv2.NORM_MINMAX)
+        return depth_map, depth_normalized.astype(np.uint8)
+
+    def close(self):
+        """Stop the worker process and release the shared buffers."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for shm in (self._frame_shm, self._depth_shm):
+            shm.close()
+            shm.unlink()
+
+
 # Singleton instance
 _depth_estimator: Optional[DepthEstimator] = None
 
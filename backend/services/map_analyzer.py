@@ -7,13 +7,11 @@ JSON file.  Subsequent server starts load the cache instantly.
 """
 
 import os
-import io
 import json
 import asyncio
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
-from PIL import Image
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,16 +38,20 @@ class MapAnalyzer:
     def __init__(self, cache_dir: Path = _DEFAULT_CACHE_DIR):
         self.cache_dir = cache_dir
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Created on first cache miss — a cached analysis never needs it
         self.client = None
         self.model_name = "gemini-2.0-flash"
 
-        if GENAI_AVAILABLE:
-            api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
-            if api_key and api_key != "your_gemini_api_key_here":
-                try:
-                    self.client = genai.Client(api_key=api_key)
-                except Exception as e:
-                    print(f"⚠️  Gemini client init failed: {e}")
+    def _ensure_client(self):
+        """Create the Gemini client once, on first use."""
+        if self.client is not None or not GENAI_AVAILABLE:
+            return
+        api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
+        if api_key and api_key != "your_gemini_api_key_here":
+            try:
+                self.client = genai.Client(api_key=api_key)
+            except Exception as e:
+                print(f"⚠️  Gemini client init failed: {e}")
 
     # ──────────────────── public API ────────────────────
 
@@ -62,26 +64,27 @@ class MapAnalyzer:
         """
         cache_file = self._cache_path(svg_path)
 
+        # File I/O, rendering and encoding run in threads — this is awaited
+        # from lifespan alongside model loading, and from /reanalyze-map
         if not force and cache_file.exists():
             print(f"📂 Loading cached map analysis from {cache_file.name}")
-            with open(cache_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return await asyncio.to_thread(self._read_json, cache_file)
 
         print("🗺️  Analysing floor plan with Gemini Vision …")
-        image = self._svg_to_image(svg_path)
-        analysis = await self._analyse_with_gemini(image)
+        png_path = await asyncio.to_thread(self._svg_to_png, svg_path)
+        png_bytes = await asyncio.to_thread(png_path.read_bytes)
+        analysis = await self._analyse_with_gemini(png_bytes)
 
         # Persist
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(analysis, f, indent=2)
+        await asyncio.to_thread(self._write_json, cache_file, analysis)
         print(f"✅ Map analysis cached → {cache_file.name}")
 
         return analysis
 
-    # ──────────────────── SVG → Image ───────────────────
+    # ───────────────────── SVG → PNG ────────────────────
 
-    def _svg_to_image(self, svg_path: str) -> Image.Image:
-        """Convert an SVG file to a PIL Image.
+    def _svg_to_png(self, svg_path: str) -> Path:
+        """Return a PNG rendering of an SVG file (rendered once, then reused).
 
         Strategy:
           1. Check for a pre-rendered PNG alongside the SVG
@@ -94,7 +97,7 @@ class MapAnalyzer:
         pre_rendered = resolved.with_suffix(".png")
         if pre_rendered.exists() and pre_rendered.stat().st_size > 1000:
             print(f"   Using pre-rendered {pre_rendered.name}")
-            return Image.open(str(pre_rendered)).convert("RGB")
+            return pre_rendered
 
         # 2. Headless browser rendering (Edge or Chrome)
         browser = self._find_browser()
@@ -122,12 +125,10 @@ class MapAnalyzer:
                     proc.kill()
 
                 if Path(png_path).exists() and Path(png_path).stat().st_size > 1000:
-                    img = Image.open(png_path).convert("RGB")
-                    # Save as pre-rendered for next time
-                    img.save(str(pre_rendered), "PNG")
-                    Path(png_path).unlink(missing_ok=True)
+                    # Keep as pre-rendered for next time
+                    Path(png_path).replace(pre_rendered)
                     print(f"   Rendered SVG → {pre_rendered.name}")
-                    return img
+                    return pre_rendered
             except Exception as e:
                 print(f"   Browser render failed: {e}")
 
@@ -158,15 +159,13 @@ class MapAnalyzer:
 
     # ──────────────── Gemini Vision call ────────────────
 
-    async def _analyse_with_gemini(self, image: Image.Image) -> Dict[str, Any]:
+    async def _analyse_with_gemini(self, png_bytes: bytes) -> Dict[str, Any]:
+        self._ensure_client()
         if not self.client:
             raise RuntimeError("Gemini client not initialised")
 
-        # Prepare the image
-        buf = io.BytesIO()
-        image.save(buf, format="JPEG", quality=90)
-        img_bytes = buf.getvalue()
-        image_part = types.Part.from_bytes(data=img_bytes, mime_type="image/jpeg")
+        # Gemini takes the PNG as-is — no decode / JPEG re-encode round-trip
+        image_part = types.Part.from_bytes(data=png_bytes, mime_type="image/png")
 
         prompt = self._build_analysis_prompt()
 
@@ -267,6 +266,16 @@ Return ONLY the JSON object. No other text."""
 
     # ──────────────────── Helpers ───────────────────────
 
+    @staticmethod
+    def _read_json(path: Path) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict[str, Any]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
     def _cache_path(self, svg_path: str) -> Path:
         stem = Path(svg_path).stem  # e.g. "basement"
         return self.cache_dir / f"{stem}_analysis.json"
@@ -6,6 +6,7 @@ The graph nodes include room door positions and hallway waypoints so
 that every computed path follows indoor corridors and never crosses walls.
 """
 
+import heapq
 import math
 from typing import List, Dict, Tuple, Optional, Any
 
@@ -100,30 +101,31 @@ class PathFinder:
             x, y = self.nodes[start_node]
             return [{"x": x, "y": y, "label": start_node}]
 
-        # Dijkstra
+        # Dijkstra with a binary heap — O(E log V) instead of a linear
+        # scan of all unvisited nodes per step
         INF = float("inf")
-        dist = {n: INF for n in self.nodes}
-        prev: Dict[str, Optional[str]] = {n: None for n in self.nodes}
-        dist[start_node] = 0
-        unvisited = set(self.nodes.keys())
-
-        while unvisited:
-            current = min(unvisited, key=lambda n: dist[n])
-            if dist[current] == INF:
-                break
+        dist: Dict[str, float] = {start_node: 0.0}
+        prev: Dict[str, Optional[str]] = {start_node: None}
+        heap: List[Tuple[float, str]] = [(0.0, start_node)]
+        visited = set()
+
+        while heap:
+            d, current = heapq.heappop(heap)
+            if current in visited:
+                continue  # stale entry, a shorter route was already settled
             if current == end_node:
                 break
-            unvisited.remove(current)
+            visited.add(current)
 
             for neighbour, weight in self.graph.get(current, {}).items():
-                if neighbour in unvisited:
-                    alt = dist[current] + weight
-                    if alt < dist[neighbour]:
-                        dist[neighbour] = alt
-                        prev[neighbour] = current
+                alt = d + weight
+                if alt < dist.get(neighbour, INF):
+                    dist[neighbour] = alt
+                    prev[neighbour] = current
+                    heapq.heappush(heap, (alt, neighbour))
 
         # Reconstruct
-        if dist[end_node] == INF:
+        if end_node not in dist:
             return None
 
         path_ids: List[str] = []
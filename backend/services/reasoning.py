@@ -4,17 +4,32 @@ Uses DISTANCE only to determine obstacles. No hardcoded object lists.
 """
 
 import os
+import re
+import json
 import base64
 import io
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _pil_to_jpeg(image, quality: int = 85) -> bytes:
+    """Baseline 4:2:0 JPEG of a PIL Image — the encoder's fastest path."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, subsampling=2,
+               optimize=False, progressive=False)
+    return buffer.getvalue()
+
+
 # ── Retry helper ──
 GEMINI_TIMEOUT_S = 12.0
 GEMINI_MAX_RETRIES = 2
+# Upper bound on in-flight Gemini calls — bursts queue here instead of
+# tripping the rate limit (and then paying for retries)
+GEMINI_MAX_CONCURRENCY = 4
 
 # Try to import new google-genai SDK (preferred over deprecated google.generativeai)
 try:
@@ -51,12 +66,23 @@ class ObstacleClassifier:
     def __init__(self):
         self.client = None
         self.model_name = "gemini-2.0-flash"  # Use latest model
+        # Dedicated threads for the blocking SDK, so Gemini calls never
+        # occupy the default executor used by CV work
+        self._gemini_sem = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        self._gemini_executor = ThreadPoolExecutor(
+            max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini"
+        )
 
         if GEMINI_AVAILABLE:
             api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
             if api_key and api_key != "your_gemini_api_key_here":
                 try:
-                    self.client = genai.Client(api_key=api_key)
+                    # Client-side HTTP timeout (ms), so a hung request really
+                    # returns its executor thread instead of holding it forever
+                    self.client = genai.Client(
+                        api_key=api_key,
+                        http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT_S * 1000)),
+                    )
                     # Test the model
                     test_response = self.client.models.generate_content(
                         model=self.model_name,
@@ -69,6 +95,33 @@ class ObstacleClassifier:
             else:
                 print("⚠️ GOOGLE_GEMINI_API_KEY not configured — using rule-based reasoning")
 
+    async def _generate(self, contents) -> Any:
+        """
+        One generate_content call: concurrency-limited, off the loop, with timeout.
+
+        The concurrency slot is held until the SDK call actually returns, not
+        just until we stop waiting for it — so the semaphore bounds the calls
+        really occupying executor threads.
+        """
+        await self._gemini_sem.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._gemini_executor,
+            partial(
+                self.client.models.generate_content,
+                model=self.model_name,
+                contents=contents,
+            ),
+        )
+
+        def _release(done):
+            self._gemini_sem.release()
+            if not done.cancelled():
+                done.exception()  # mark retrieved — a timed-out caller is gone
+
+        future.add_done_callback(_release)
+        return await asyncio.wait_for(asyncio.shield(future), timeout=GEMINI_TIMEOUT_S)
+
     # Average step length in meters (used to convert distances to steps)
     STEP_LENGTH_M = 0.75
 
@@ -172,7 +225,13 @@ class ObstacleClassifier:
     # ───────────────── classification ──────────────────
 
     def classify_all(self, detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Add spatial metadata to all detections."""
+        """
+        Add spatial metadata to all detections.
+
+        Every output dict is guaranteed to have label, distance, position,
+        corridor_coverage, is_blocking_path and threat_level, so consumers
+        index them directly.
+        """
         results = []
         for d in detections:
             dist = self.get_effective_distance(d)
@@ -181,6 +240,7 @@ class ObstacleClassifier:
 
             results.append({
                 **d,
+                "label": d.get("label", "object"),
                 "distance": dist,
                 "position": self.get_position(cx),
                 "corridor_coverage": round(self.get_corridor_coverage(d), 2),
@@ -197,17 +257,24 @@ class ObstacleClassifier:
 
     # ─────────── navigation instruction (rule-based) ───────────
 
-    def generate_navigation_instruction(self, detections: List[Dict[str, Any]]) -> str:
+    def generate_navigation_instruction(
+        self,
+        detections: List[Dict[str, Any]],
+        classified: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
         """
         Generate a concise verbal instruction using step-based distances.
 
         Converts metre distances to approximate walking steps so the user
         hears e.g. "Go 3 steps forward" or "Take 2 steps to your right".
+        Pass ``classified`` (the classify_all output for ``detections``)
+        when the caller already has it, to skip re-classifying.
         """
         if not detections:
             return "Path clear. Go 3 steps forward."
 
-        classified = self.classify_all(detections)
+        if classified is None:
+            classified = self.classify_all(detections)
         blocking   = [d for d in classified if d["is_blocking_path"]]
 
         # ── Nothing truly blocking ──
@@ -216,12 +283,12 @@ class ObstacleClassifier:
             nearby = [
                 d for d in classified
                 if d["distance"] < self.CAUTION_DISTANCE
-                and d.get("corridor_coverage", 0) > 0.05
+                and d["corridor_coverage"] > 0.05
             ]
             if nearby:
                 closest = min(nearby, key=lambda x: x["distance"])
-                label = closest.get("label", "object")
-                pos   = closest.get("position", "side")
+                label = closest["label"]
+                pos   = closest["position"]
                 steps = self.meters_to_steps(closest["distance"])
                 return f"{label} on your {pos}, {steps} step{'s' if steps != 1 else ''} away. Path is clear, keep walking forward."
             return "Path clear. Go 3 steps forward."
@@ -229,9 +296,9 @@ class ObstacleClassifier:
         # ── Something IS blocking ──
         blocking.sort(key=lambda x: x["distance"])
         closest  = blocking[0]
-        label    = closest.get("label", "object")
+        label    = closest["label"]
         dist     = closest["distance"]
-        coverage = closest.get("corridor_coverage", 1.0)
+        coverage = closest["corridor_coverage"]
         steps_away = self.meters_to_steps(dist)
 
         # Determine which side is clear
@@ -277,8 +344,6 @@ class ObstacleClassifier:
           "Go to room 0010"
             → {"start_room": null, "destination": "0010"}
         """
-        import re
-
         # ── 1. Fast regex parsing ──
         text_lower = user_text.lower()
 
@@ -328,19 +393,11 @@ Room numbers are typically 3-4 digit strings like "0020" or "0010".
 """
 
         try:
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.models.generate_content,
-                    model=self.model_name,
-                    contents=prompt,
-                ),
-                timeout=GEMINI_TIMEOUT_S,
-            )
+            response = await self._generate(prompt)
             text = response.text.strip()
             if "```" in text:
                 text = text.split("```")[1].replace("json", "").strip()
 
-            import json
             parsed = json.loads(text)
             # Merge with regex results (regex is more reliable for digits)
             return {
@@ -358,6 +415,7 @@ Room numbers are typically 3-4 digit strings like "0020" or "0010".
         """
         Use Gemini's MULTIMODAL capabilities (Vision + Text).
         Sends the actual image to the model for "human-like" scene understanding.
+        ``image_data`` may be a PIL Image or JPEG bytes.
         """
         # Always fallback to rule-based if client is not enabled or if previous calls failed freqently
         if not self.client:
@@ -370,11 +428,11 @@ Room numbers are typically 3-4 digit strings like "0020" or "0010".
             relevant = [d for d in classified if d["distance"] < 8.0]
             scene_desc = []
             for d in relevant:
-                label    = d.get("label", "object")
-                dist     = d.get("distance", 0)
-                pos      = d.get("position", "unknown")
-                cov      = d.get("corridor_coverage", 0)
-                blocking = d.get("is_blocking_path", False)
+                label    = d["label"]
+                dist     = d["distance"]
+                pos      = d["position"]
+                cov      = d["corridor_coverage"]
+                blocking = d["is_blocking_path"]
                 scene_desc.append(
                     f"- {label} at {dist:.1f}m ({pos}), "
                     f"covers {cov*100:.0f}% of walking path, "
@@ -386,11 +444,11 @@ Room numbers are typically 3-4 digit strings like "0020" or "0010".
             # Convert distances to steps for the prompt
             step_context = []
             for d in relevant:
-                label_   = d.get("label", "object")
-                dist_    = d.get("distance", 0)
+                label_   = d["label"]
+                dist_    = d["distance"]
                 steps_   = max(1, round(dist_ / self.STEP_LENGTH_M))
-                pos_     = d.get("position", "unknown")
-                blocking_ = d.get("is_blocking_path", False)
+                pos_     = d["position"]
+                blocking_ = d["is_blocking_path"]
                 step_context.append(
                     f"- {label_}: {steps_} step{'s' if steps_ != 1 else ''} away, on the {pos_}, "
                     f"{'BLOCKING path' if blocking_ else 'not blocking'}"
@@ -419,10 +477,13 @@ RULES:
 - Do not mention percentages, meters, the map, the screen, or anything visual. Only steps and verbal directions.
 """
             try:
-                # Convert PIL Image to base64 for the new google-genai API
-                img_buffer = io.BytesIO()
-                image_data.save(img_buffer, format='JPEG')
-                img_bytes = img_buffer.getvalue()
+                if isinstance(image_data, (bytes, bytearray, memoryview)):
+                    # Already-encoded JPEG — send as-is, no PIL round-trip
+                    img_bytes = bytes(image_data)
+                else:
+                    # Encode PIL Image to JPEG bytes for the google-genai API
+                    # (off the event loop — it's a full-frame encode)
+                    img_bytes = await asyncio.to_thread(_pil_to_jpeg, image_data)
                 
                 # Create image part using the new types format
                 image_part = types.Part.from_bytes(
@@ -433,14 +494,7 @@ RULES:
                 last_err = None
                 for attempt in range(GEMINI_MAX_RETRIES + 1):
                     try:
-                        response = await asyncio.wait_for(
-                            asyncio.to_thread(
-                                self.client.models.generate_content,
-                                model=self.model_name,
-                                contents=[prompt, image_part],
-                            ),
-                            timeout=GEMINI_TIMEOUT_S,
-                        )
+                        response = await self._generate([prompt, image_part])
                         return response.text.strip()
                     except (asyncio.TimeoutError, Exception) as retry_err:
                         last_err = retry_err
@@ -465,12 +519,12 @@ RULES:
 
         scene_desc = []
         for d in relevant:
-            label    = d.get("label", "object")
-            dist     = d.get("distance", 0)
+            label    = d["label"]
+            dist     = d["distance"]
             steps    = self.meters_to_steps(dist)
-            pos      = d.get("position", "unknown")
-            cov      = d.get("corridor_coverage", 0)
-            blocking = d.get("is_blocking_path", False)
+            pos      = d["position"]
+            cov      = d["corridor_coverage"]
+            blocking = d["is_blocking_path"]
             scene_desc.append(
                 f"- {label}: {pos}, {steps} step{'s' if steps != 1 else ''} away, "
                 f"covers {cov*100:.0f}% of path, "
@@ -491,14 +545,7 @@ RULES:
         last_err = None
         for attempt in range(GEMINI_MAX_RETRIES + 1):
             try:
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(
-                        self.client.models.generate_content,
-                        model=self.model_name,
-                        contents=prompt_text,
-                    ),
-                    timeout=GEMINI_TIMEOUT_S,
-                )
+                response = await self._generate(prompt_text)
                 return response.text.strip()
             except (asyncio.TimeoutError, Exception) as retry_err:
                 last_err = retry_err
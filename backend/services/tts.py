@@ -5,7 +5,7 @@ Provides clear, natural guidance for visually impaired users.
 
 import os
 import asyncio
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional, Set
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -31,12 +31,12 @@ def get_elevenlabs_client():
         raise ImportError("elevenlabs package not installed. Run: pip install elevenlabs")
 
 
-def _sync_generate_voice(
+def _open_voice_stream(
     text: str,
     voice_id: str,
     model_id: str,
-) -> bytes:
-    """Synchronous TTS generation (runs in thread pool)."""
+) -> Iterator[bytes]:
+    """Start a TTS conversion and return its MP3 chunk iterator (blocking reads)."""
     client = get_elevenlabs_client()
     response = client.text_to_speech.convert(
         text=text,
@@ -44,7 +44,16 @@ def _sync_generate_voice(
         model_id=model_id,
         output_format="mp3_44100_128",
     )
-    return b"".join(response)
+    return iter(response)
+
+
+def _sync_generate_voice(
+    text: str,
+    voice_id: str,
+    model_id: str,
+) -> bytes:
+    """Synchronous TTS generation (runs in thread pool)."""
+    return b"".join(_open_voice_stream(text, voice_id, model_id))
 
 
 async def generate_voice_and_track_cost(
@@ -91,6 +100,100 @@ async def generate_voice_and_track_cost(
     raise last_err  # type: ignore[misc]
 
 
+async def stream_voice_and_track_cost(
+    text: str,
+    voice_id: str = "JBFqnCBsd6RMkjVDRZzb",  # Default: calm, clear voice
+    model_id: str = "eleven_flash_v2_5",  # Use Flash v2.5 for low latency
+    max_retries: int = 2,
+    timeout_s: float = 15.0,
+) -> AsyncIterator[bytes]:
+    """
+    Stream speech from text as MP3 chunks (async, non-blocking).
+
+    Chunks are yielded as ElevenLabs produces them instead of being
+    joined in memory, so a StreamingResponse can start sending audio
+    before synthesis finishes. Retries only cover the first chunk —
+    once audio has been yielded the stream cannot be restarted.
+
+    Args:
+        text: Text to convert to speech
+        voice_id: ElevenLabs voice ID
+        model_id: ElevenLabs model to use
+        max_retries: Number of retry attempts before the first chunk
+        timeout_s: Timeout per chunk read in seconds
+
+    Yields:
+        Audio data chunks (MP3 format)
+    """
+    last_err: Optional[Exception] = None
+    for attempt in range(max_retries + 1):
+        chunks = first_read = None
+        try:
+            chunks = await asyncio.to_thread(_open_voice_stream, text, voice_id, model_id)
+            # Shielded so a timeout leaves the read running — the stream can
+            # only be closed once the thread blocked in next() lets go of it
+            first_read = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+            first = await asyncio.wait_for(asyncio.shield(first_read), timeout=timeout_s)
+            break
+        except asyncio.TimeoutError:
+            last_err = TimeoutError(f"TTS timed out after {timeout_s}s")
+            print(f"✗ TTS timeout (attempt {attempt + 1}/{max_retries + 1})")
+            if first_read is not None:
+                _close_when_done(chunks, first_read)
+        except Exception as e:
+            last_err = e
+            print(f"✗ TTS error (attempt {attempt + 1}/{max_retries + 1}): {e}")
+            if chunks is not None:
+                await asyncio.to_thread(_close_stream, chunks)
+        # Exponential backoff before retry
+        if attempt < max_retries:
+            await asyncio.sleep(0.5 * (2 ** attempt))
+    else:
+        raise last_err  # type: ignore[misc]
+
+    read = None
+    try:
+        chunk = first
+        while chunk is not None:
+            # Zero-length chunks would only produce empty HTTP body writes
+            if chunk:
+                yield chunk
+            read = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+            chunk = await asyncio.wait_for(asyncio.shield(read), timeout=timeout_s)
+    finally:
+        # Client went away or a read timed out: release the upstream HTTP
+        # response (after the in-flight read, if one is still blocked)
+        if read is not None and not read.done():
+            _close_when_done(chunks, read)
+        else:
+            await asyncio.to_thread(_close_stream, chunks)
+
+
+def _close_stream(chunks: Iterator[bytes]):
+    """Close a TTS chunk iterator, releasing its HTTP response (blocking)."""
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
+
+
+# Background closes of abandoned streams (referenced so they aren't GC'd)
+_pending_closes: Set[asyncio.Task] = set()
+
+
+def _close_when_done(chunks: Iterator[bytes], read: "asyncio.Future"):
+    """Close an abandoned stream once its in-flight read returns."""
+    async def close_after_read():
+        try:
+            await read
+        except Exception:
+            pass
+        await asyncio.to_thread(_close_stream, chunks)
+
+    task = asyncio.create_task(close_after_read())
+    _pending_closes.add(task)
+    task.add_done_callback(_pending_closes.discard)
+
+
 def generate_obstacle_announcement(
     objects: list,
     max_objects: int = 3,
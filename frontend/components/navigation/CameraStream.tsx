@@ -18,7 +18,8 @@ interface CameraStreamProps {
   serverUrl: string;
   onDetections?: (objects: DetectedObject[]) => void;
   onInstruction?: (instruction: string) => void;
-  onFrame?: (frameBase64: string) => void;
+  /** Annotated JPEG returned by the server for each sent frame */
+  onFrame?: (frameJpeg: Blob) => void;
   className?: string;
   autoStart?: boolean;
   /** Target send width in px (lower = faster). Default 240 */
@@ -49,6 +50,7 @@ function CameraStreamInner({
   const [isStreaming, setIsStreaming] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [processedFrame, setProcessedFrame] = useState<string | null>(null);
+  const frameUrlRef = useRef<string | null>(null); // object URL behind processedFrame
 
   // ── Backpressure & adaptive rate ──
   const awaitingResponseRef = useRef(false);
@@ -73,6 +75,8 @@ function CameraStreamInner({
 
     const wsUrl = serverUrl.replace(/^http/, "ws") + "/ws/video";
     const ws = new WebSocket(wsUrl);
+    // Frames travel as binary JPEG both ways — no base64 inflation
+    ws.binaryType = "blob";
 
     ws.onopen = () => {
       setIsConnected(true);
@@ -81,6 +85,20 @@ function CameraStreamInner({
     };
 
     ws.onmessage = (event) => {
+      // Binary message = annotated JPEG, sent right after its metadata
+      if (typeof event.data !== "string") {
+        const frame = event.data as Blob;
+        const url = URL.createObjectURL(frame);
+        if (frameUrlRef.current) URL.revokeObjectURL(frameUrlRef.current);
+        frameUrlRef.current = url;
+        setProcessedFrame(url);
+        onFrame?.(frame);
+
+        // Release backpressure — allow next send
+        awaitingResponseRef.current = false;
+        return;
+      }
+
       const data = JSON.parse(event.data);
       if (data.error) {
         setError(data.error);
@@ -107,20 +125,13 @@ function CameraStreamInner({
         fpsTimerRef.current = now;
       }
 
-      // Update displayed frame
-      if (data.frame_base64) {
-        setProcessedFrame(`data:image/jpeg;base64,${data.frame_base64}`);
-        onFrame?.(data.frame_base64);
-      }
       if (data.objects) {
         onDetections?.(data.objects);
       }
       if (data.instruction) {
         onInstruction?.(data.instruction);
       }
-
-      // Release backpressure — allow next send
-      awaitingResponseRef.current = false;
+      // Backpressure is released once the frame itself arrives
     };
 
     ws.onerror = () => {
@@ -201,6 +212,10 @@ function CameraStreamInner({
     setIsStreaming(false);
     setIsConnected(false);
     setProcessedFrame(null);
+    if (frameUrlRef.current) {
+      URL.revokeObjectURL(frameUrlRef.current);
+      frameUrlRef.current = null;
+    }
     awaitingResponseRef.current = false;
     wsRetriesRef.current = 0;
   }, []);
@@ -241,14 +256,9 @@ function CameraStreamInner({
         (blob) => {
           if (!blob || !wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
 
-          const reader = new FileReader();
-          reader.onload = () => {
-            const base64 = (reader.result as string).split(",")[1];
-            awaitingResponseRef.current = true;
-            sendTimestampRef.current = Date.now();
-            wsRef.current?.send(base64);
-          };
-          reader.readAsDataURL(blob);
+          awaitingResponseRef.current = true;
+          sendTimestampRef.current = Date.now();
+          wsRef.current.send(blob);
         },
         "image/jpeg",
         sendQuality
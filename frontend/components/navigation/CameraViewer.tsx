@@ -18,7 +18,7 @@ interface CameraViewerProps {
   serverUrl: string;
   onDetections?: (objects: DetectedObject[]) => void;
   onInstruction?: (instruction: string) => void;
-  onFrame?: (frameBase64: string) => void;
+  onFrame?: (frame: Blob) => void;
   className?: string;
   autoConnect?: boolean;
 }
@@ -40,6 +40,7 @@ function CameraViewerInner({
   const [hasData, setHasData] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [processedFrame, setProcessedFrame] = useState<string | null>(null);
+  const frameUrlRef = useRef<string | null>(null); // object URL behind processedFrame
 
   // FPS counter
   const [fps, setFps] = useState(0);
@@ -58,6 +59,8 @@ function CameraViewerInner({
 
     const wsUrl = serverUrl.replace(/^http/, "ws") + "/ws/viewer";
     const ws = new WebSocket(wsUrl);
+    // Frames arrive as binary messages, each right after its metadata
+    ws.binaryType = "blob";
 
     ws.onopen = () => {
       setIsConnected(true);
@@ -74,6 +77,17 @@ function CameraViewerInner({
     };
 
     ws.onmessage = (event) => {
+      // Binary message = annotated frame (JPEG or WebP)
+      if (typeof event.data !== "string") {
+        const frame = event.data as Blob;
+        const url = URL.createObjectURL(frame);
+        if (frameUrlRef.current) URL.revokeObjectURL(frameUrlRef.current);
+        frameUrlRef.current = url;
+        setProcessedFrame(url);
+        onFrame?.(frame);
+        return;
+      }
+
       try {
         const data = JSON.parse(event.data);
 
@@ -96,11 +110,6 @@ function CameraViewerInner({
           fpsTimerRef.current = now;
         }
 
-        // Update displayed frame
-        if (data.frame_base64) {
-          setProcessedFrame(`data:image/jpeg;base64,${data.frame_base64}`);
-          onFrame?.(data.frame_base64);
-        }
         if (data.objects) {
           onDetections?.(data.objects);
         }
@@ -160,6 +169,10 @@ function CameraViewerInner({
     setIsConnected(false);
     setHasData(false);
     setProcessedFrame(null);
+    if (frameUrlRef.current) {
+      URL.revokeObjectURL(frameUrlRef.current);
+      frameUrlRef.current = null;
+    }
     wsRetriesRef.current = 0;
   }, []);
 